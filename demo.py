@@ -1,3 +1,6 @@
+import matplotlib
+matplotlib.use('Agg')  # charts are written to images/ from a background thread
+
 from src.nl2sql import NL2SQLDemo
 
 demo = NL2SQLDemo('data/stock_database.db')
@@ -20,6 +23,7 @@ demo.ask("Show me risk metrics for all stocks")
 
 print("\n5️⃣ Daily Returns Query:")
 demo.ask("What are the daily returns for the last 30 days?")
+demo.close()
 
 print("\n" + "="*60)
 print("✅ Demo complete! Check images/ folder for charts.")
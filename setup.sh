@@ -0,0 +1,8 @@
+#!/usr/bin/env bash
+set -e
+
+pip install -r requirements.txt
+
+# Optional: precompile the rolling kernels so the demo skips Numba JIT at startup.
+# numba.pycc is deprecated; when it is unavailable the kernels are JIT-compiled instead.
+python -m src._rolling_aot || echo "AOT build skipped, using JIT"
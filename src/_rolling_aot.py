@@ -0,0 +1,22 @@
+"""
+Rolling AOT - Ahead-of-time build of the rolling kernels
+
+Run `python -m src._rolling_aot` to produce the rolling_aot extension next to
+this file; src.rolling picks it up automatically and falls back to JIT otherwise.
+"""
+
+import os
+from numba.pycc import CC
+
+from .rolling import _rolling_mean, _rolling_return
+
+
+cc = CC('rolling_aot')
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+cc.export('rolling_mean_f64', 'f8[:](f8[:], i8)')(_rolling_mean.py_func)
+cc.export('rolling_return_f64', 'f8[:](f8[:])')(_rolling_return.py_func)
+
+
+if __name__ == "__main__":
+    cc.compile()
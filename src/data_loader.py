@@ -7,19 +7,44 @@ import sqlite3
 import yfinance as yf
 
 
+# Symbols per yf.download request
+BATCH_SIZE = 20
+
+
+def _narrow(hist: pd.DataFrame) -> pd.DataFrame:
+    """
+    Store volume as the smallest integer type that fits.
+    Prices stay float64: SQLite REAL is 8 bytes anyway and float32 would persist rounding noise.
+    """
+    if 'Volume' in hist.columns:
+        hist['Volume'] = pd.to_numeric(hist['Volume'], downcast='integer')
+    return hist
+
+
+def _download_batch(tickers: list, period: str) -> list:
+    """
+    Download one batch of tickers in a single request, one frame per ticker.
+    """
+    raw = yf.download(tickers, period=period, group_by='ticker', threads=True,
+                      auto_adjust=True, actions=True, progress=False)
+    if not isinstance(raw.columns, pd.MultiIndex):
+        # Older yfinance returns flat columns when the batch holds a single ticker
+        raw = pd.concat({tickers[0]: raw}, axis=1)
+    return [_narrow(raw[t].dropna(how='all')).assign(ticker=t).reset_index() for t in tickers]
+
+
 def fetch_stock_data(tickers: list, period: str = "1y") -> pd.DataFrame:
     """
     Fetch historical stock data from Yahoo Finance.
     """
+    print(f"Fetching data for {', '.join(tickers)}...")
     all_data = []
     
-    for ticker in tickers:
-        print(f"Fetching data for {ticker}...")
-        stock = yf.Ticker(ticker)
-        hist = stock.history(period=period)
-        hist['ticker'] = ticker
-        hist.reset_index(inplace=True)
-        all_data.append(hist)
+    # Batches run one after another: yf.download keeps per-call results in module
+    # globals, so concurrent calls would overwrite each other. Within a batch,
+    # threads=True already parallelizes the per-symbol requests safely.
+    for i in range(0, len(tickers), BATCH_SIZE):
+        all_data.extend(_download_batch(tickers[i:i + BATCH_SIZE], period))
     
     combined = pd.concat(all_data, ignore_index=True)
     combined.columns = [col.lower().replace(' ', '_') for col in combined.columns]
@@ -27,6 +52,19 @@ def fetch_stock_data(tickers: list, period: str = "1y") -> pd.DataFrame:
     return combined
 
 
+def _sqlite_type(dtype) -> str:
+    """
+    Map a pandas dtype to the SQLite column type used by to_sql.
+    """
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return 'TIMESTAMP'
+    return 'TEXT'
+
+
 def create_database(df: pd.DataFrame, db_path: str = "data/stock_database.db"):
     """
     Create SQLite database from DataFrame.
@@ -34,14 +72,50 @@ def create_database(df: pd.DataFrame, db_path: str = "data/stock_database.db"):
     import os
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
     
-    conn = sqlite3.connect(db_path)
-    df.to_sql('stock_prices', conn, index=False, if_exists='replace')
+    # Dates are stored as naive UTC text so readers can parse the column in one pass
+    df = df.assign(date=pd.to_datetime(df['date'], utc=True).dt.tz_localize(None).astype('datetime64[ns]'))
+    cols_ddl = ", ".join(f'"{col}" {_sqlite_type(dtype)}' for col, dtype in df.dtypes.items())
+    placeholders = ", ".join("?" * len(df.columns))
+    # Timestamps are bound as their ISO text, matching what to_sql used to write;
+    # missing values (NaN, NaT, pd.NA) are bound as None so they land as NULL
+    rows = df.astype({col: str for col, dtype in df.dtypes.items()
+                      if pd.api.types.is_datetime64_any_dtype(dtype)})
+    rows = rows.astype(object).where(df.notna(), None)
     
-    cursor = conn.cursor()
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ticker ON stock_prices(ticker)")
-    cursor.execute("CREATE INDEX IF NOT EXISTS idx_date ON stock_prices(date)")
-    conn.commit()
-    conn.close()
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        # Load phase: no fsync and an in-memory journal, the file is rebuilt from scratch anyway
+        conn.executescript("""
+            PRAGMA synchronous=OFF;
+            PRAGMA journal_mode=MEMORY;
+            PRAGMA cache_size=-65536;
+            PRAGMA temp_store=MEMORY;
+        """)
+        
+        cursor = conn.cursor()
+        cursor.execute("BEGIN")
+        cursor.execute("DROP TABLE IF EXISTS stock_prices")
+        # Dropped for files built by older versions; derived metrics are now computed in-process
+        cursor.execute("DROP TABLE IF EXISTS stock_features")
+        cursor.execute(f"CREATE TABLE stock_prices ({cols_ddl})")
+        cursor.executemany(f"INSERT INTO stock_prices VALUES ({placeholders})",
+                           rows.itertuples(index=False, name=None))
+        # Indexes are built after the bulk insert so they are not maintained per row
+        # Covering index: per-ticker scans ordered by date read close/high/low without touching the table
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_tdchl ON stock_prices(ticker, date, close, high, low)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_date ON stock_prices(date)")
+        cursor.execute("ANALYZE")
+        cursor.execute("COMMIT")
+        
+        # Readers open the file immutable, so leave it in rollback-journal mode with no WAL sidecar
+        conn.execute("PRAGMA journal_mode=DELETE")
+    except Exception:
+        # Keep the previous contents; the load-phase pragmas only last as long as this connection
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
     
     print(f"✅ Database created at {db_path}")
     print(f"📊 Total records: {len(df)}")
@@ -3,11 +3,130 @@
 NL2SQL Demo - Natural Language to SQL for Financial Analytics
 """
 
+import re
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+import numpy as np
 import pandas as pd
 import sqlite3
+import matplotlib
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
-from typing import Tuple
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from .rolling import rolling_mean, rolling_return, warmup
+
+
+# Applied once per read-only connection: no writes, 64 MB page cache, 256 MB mmap reads.
+# Journal mode is persisted in the file header, so only create_database sets it.
+SQLITE_PRAGMAS = (
+    "PRAGMA query_only=1",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+)
+
+
+# One pass over the question tags every intent keyword it contains
+_ROUTER_RE = re.compile(
+    r"(?P<ma>moving average|trend)|(?P<ret>return|daily change)|(?P<risk>risk|drawdown|worst)"
+    r"|(?P<vol>volatil(?:e|ity))|(?P<avg>average|avg)|(?P<recent>latest|recent)",
+    re.I,
+)
+# When several intents match, the earliest in this tuple wins
+_INTENT_PRIORITY = ('ma', 'ret', 'risk', 'vol', 'avg', 'recent')
+
+_TICKER_RE = re.compile(r"apple|aapl|microsoft|msft|nvidia|nvda", re.I)
+_TICKERS = {
+    'apple': 'AAPL', 'aapl': 'AAPL',
+    'microsoft': 'MSFT', 'msft': 'MSFT',
+    'nvidia': 'NVDA', 'nvda': 'NVDA',
+}
+# When several tickers are mentioned, the earliest in this tuple wins
+_TICKER_PRIORITY = ('AAPL', 'MSFT', 'NVDA')
+
+
+def _classify(q: str) -> Optional[str]:
+    """Map a question to its query intent, or None for the fallback."""
+    found = {m.lastgroup for m in _ROUTER_RE.finditer(q)}
+    return next((intent for intent in _INTENT_PRIORITY if intent in found), None)
+
+
+def _extract_ticker(q: str) -> str:
+    """Extract stock ticker from natural language query, defaulting to AAPL."""
+    found = {_TICKERS[m.group().lower()] for m in _TICKER_RE.finditer(q)}
+    return next((ticker for ticker in _TICKER_PRIORITY if ticker in found), 'AAPL')
+
+
+# Intents answered in-process by NL2SQLDemo._kernel_plan carry an explanation but no SQL
+def _explain_ma(q: str) -> Tuple[Optional[str], tuple, str]:
+    return None, (), f"7-day and 30-day moving averages for {_extract_ticker(q)}"
+
+
+def _explain_returns(q: str) -> Tuple[Optional[str], tuple, str]:
+    return None, (), "Daily returns for all stocks"
+
+
+def _explain_risk(q: str) -> Tuple[Optional[str], tuple, str]:
+    return None, (), "Risk metrics: worst day, avg loss, down day frequency"
+
+
+def _explain_volatility(q: str) -> Tuple[Optional[str], tuple, str]:
+    return None, (), "Average daily volatility by stock"
+
+
+def _sql_avg(q: str) -> Tuple[str, tuple, str]:
+    ticker = _extract_ticker(q)
+    if ticker:
+        sql = "SELECT AVG(close) as avg_price FROM stock_prices WHERE ticker = ?"
+        return sql, (ticker,), f"Average closing price for {ticker}"
+    else:
+        sql = "SELECT ticker, AVG(close) as avg_price FROM stock_prices GROUP BY ticker"
+        return sql, (), "Average closing price for all stocks"
+
+
+def _sql_recent(q: str) -> Tuple[str, tuple, str]:
+    return "SELECT * FROM stock_prices ORDER BY date DESC LIMIT 10", (), "Most recent 10 trading days"
+
+
+def _sql_sample(q: str) -> Tuple[str, tuple, str]:
+    return "SELECT * FROM stock_prices LIMIT 5", (), "Sample data"
+
+
+_SQL_BUILDERS = {
+    'ma': _explain_ma,
+    'ret': _explain_returns,
+    'risk': _explain_risk,
+    'vol': _explain_volatility,
+    'avg': _sql_avg,
+    'recent': _sql_recent,
+}
+
+
+def _canonical(question: str) -> str:
+    """Canonical form of a question: lowercased, whitespace collapsed, company names folded to tickers."""
+    q = re.sub(r'\s+', ' ', question.strip().lower())
+    return _TICKER_RE.sub(lambda m: _TICKERS[m.group().lower()].lower(), q)
+
+
+def _headless() -> bool:
+    """True when matplotlib renders off-screen (Agg), which is safe off the main thread."""
+    return matplotlib.get_backend().lower().startswith('agg')
+
+
+@lru_cache(maxsize=256)
+def _gen(q: str) -> Tuple[Optional[str], tuple, str]:
+    """Build (sql, params, explanation) for a canonical question; memoized per question."""
+    return _SQL_BUILDERS.get(_classify(q), _sql_sample)(q)
+
+
+class _TickerPrices(NamedTuple):
+    """One ticker's date-ordered price arrays."""
+    date: np.ndarray
+    close: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
 
 
 class NL2SQLDemo:
@@ -18,146 +137,258 @@ class NL2SQLDemo:
     def __init__(self, db_path: str):
         self.db_path = db_path
         self.query_history = []
-        
-    def generate_sql(self, natural_query: str) -> Tuple[str, str]:
-        """Convert natural language question to SQL query."""
-        q = natural_query.lower()
-        
-        # Moving averages
-        if 'moving average' in q or 'trend' in q:
-            ticker = self._extract_ticker(q)
-            sql = f"""
-                SELECT date, close,
-                    AVG(close) OVER (ORDER BY date ROWS 6 PRECEDING) as ma_7,
-                    AVG(close) OVER (ORDER BY date ROWS 29 PRECEDING) as ma_30
-                FROM stock_prices 
-                WHERE ticker = '{ticker}' 
-                ORDER BY date
-            """.strip()
-            return sql, f"7-day and 30-day moving averages for {ticker}"
-        
-        # Daily returns
-        if 'return' in q or 'daily change' in q:
-            sql = """
-                SELECT ticker, date, close,
-                    ROUND((close - LAG(close) OVER (PARTITION BY ticker ORDER BY date)) / 
-                          LAG(close) OVER (PARTITION BY ticker ORDER BY date) * 100, 2) as return_pct
-                FROM stock_prices 
-                ORDER BY date DESC 
-                LIMIT 30
-            """.strip()
-            return sql, "Daily returns for all stocks"
-        
-        # Risk metrics
-        if 'risk' in q or 'drawdown' in q or 'worst' in q:
-            sql = """
-                WITH daily_returns AS (
-                    SELECT ticker, 
-                        (close - LAG(close) OVER (PARTITION BY ticker ORDER BY date)) / 
-                        LAG(close) OVER (PARTITION BY ticker ORDER BY date) as ret
-                    FROM stock_prices
-                )
-                SELECT ticker,
-                    ROUND(MIN(ret)*100, 2) as worst_day_pct,
-                    ROUND(AVG(CASE WHEN ret<0 THEN ret END)*100, 2) as avg_loss_pct,
-                    ROUND(COUNT(CASE WHEN ret<0 THEN 1 END)*100.0/COUNT(*), 1) as down_days_pct
-                FROM daily_returns 
-                WHERE ret IS NOT NULL 
-                GROUP BY ticker
-            """.strip()
-            return sql, "Risk metrics: worst day, avg loss, down day frequency"
-        
-        # Volatility
-        if 'volatile' in q or 'volatility' in q:
-            sql = """
-                SELECT ticker, 
-                    ROUND(AVG((high-low)/close*100), 2) as avg_volatility_pct
-                FROM stock_prices 
-                GROUP BY ticker 
-                ORDER BY avg_volatility_pct DESC
-            """.strip()
-            return sql, "Average daily volatility by stock"
-        
-        # Average price
-        if 'average' in q or 'avg' in q:
-            ticker = self._extract_ticker(q)
-            if ticker:
-                sql = f"SELECT AVG(close) as avg_price FROM stock_prices WHERE ticker = '{ticker}'"
-                return sql, f"Average closing price for {ticker}"
+        self._conn = self._connect()
+        self._prices = self._load_prices()
+        self._schema_version = 0
+        self._result_cache: Dict[str, pd.DataFrame] = {}
+        self._fig = None
+        self._ax = None
+        # Charts render on one background thread so the next query can run meanwhile
+        self._viz_pool = ThreadPoolExecutor(max_workers=1)
+        self._viz_futures: List[Future] = []
+        warmup()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Open the database read-only and immutable: SQLite skips file locking and
+        change detection, and reads pages through the memory map.
+        """
+        uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro&immutable=1"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+    
+    def clear_cache(self) -> None:
+        """Drop cached results and reopen the database, e.g. after it is rebuilt."""
+        self._schema_version += 1
+        self._result_cache.clear()
+        self._conn.close()
+        self._conn = self._connect()
+        self._prices = self._load_prices()
+    
+    def close(self) -> None:
+        """Wait for pending charts, then close the underlying database connection."""
+        try:
+            if getattr(self, "_viz_pool", None) is not None:
+                self._viz_pool.shutdown(wait=True)
+                self._viz_pool = None
+                errors = self._report_charts(wait=True)
+                if errors:
+                    raise errors[0]
+        finally:
+            if getattr(self, "_conn", None) is not None:
+                self._conn.close()
+                self._conn = None
+    
+    def _report_charts(self, wait: bool = False) -> List[BaseException]:
+        """
+        Print the outcome of finished background charts from the calling (main) thread,
+        so worker output never interleaves with a query. Returns the render errors.
+        """
+        pending, errors = [], []
+        for future in self._viz_futures:
+            if not (wait or future.done()):
+                pending.append(future)
+                continue
+            error = future.exception()
+            if error is None:
+                print("\n📈 Visualization saved to images/latest_viz.png")
             else:
-                sql = "SELECT ticker, AVG(close) as avg_price FROM stock_prices GROUP BY ticker"
-                return sql, "Average closing price for all stocks"
-        
-        # Recent data
-        if 'latest' in q or 'recent' in q:
-            return "SELECT * FROM stock_prices ORDER BY date DESC LIMIT 10", "Most recent 10 trading days"
-        
-        # Default fallback
-        return "SELECT * FROM stock_prices LIMIT 5", "Sample data"
+                print(f"\n⚠️  Visualization failed: {error!r}")
+                errors.append(error)
+        self._viz_futures = pending
+        return errors
+    
+    def __del__(self):
+        self.close()
+    
+    def generate_sql(self, natural_query: str) -> Tuple[Optional[str], tuple, str]:
+        """Convert natural language question to SQL query; in-process intents return no SQL."""
+        return _gen(_canonical(natural_query))
     
     def _extract_ticker(self, query: str) -> str:
         """Extract stock ticker from natural language query."""
-        q = query.lower()
-        if 'apple' in q or 'aapl' in q:
-            return 'AAPL'
-        elif 'microsoft' in q or 'msft' in q:
-            return 'MSFT'
-        elif 'nvidia' in q or 'nvda' in q:
-            return 'NVDA'
-        return 'AAPL'
-    
-    def execute(self, sql: str) -> pd.DataFrame:
-        """Execute SQL query and return results as DataFrame."""
-        conn = sqlite3.connect(self.db_path)
-        try:
-            result = pd.read_sql(sql, conn)
-            return result
-        finally:
-            conn.close()
+        return _extract_ticker(query)
+    
+    def execute(self, sql: str, params: tuple = ()) -> pd.DataFrame:
+        """Execute SQL query with bound parameters and return results as DataFrame."""
+        cursor = self._conn.execute(sql, params)
+        columns = [d[0] for d in cursor.description]
+        result = pd.DataFrame.from_records(cursor.fetchall(), columns=columns)
+        if 'date' in result.columns:
+            # Dates are stored as naive UTC ISO text; parse the whole column in one pass
+            result['date'] = pd.to_datetime(result['date'])
+        return result
+    
+    def _load_prices(self) -> Dict[str, _TickerPrices]:
+        """Preload each ticker's date-ordered arrays once; the in-process metrics all read these."""
+        prices = self.execute("SELECT ticker, date, close, high, low FROM stock_prices ORDER BY ticker, date")
+        return {
+            ticker: _TickerPrices(
+                group['date'].to_numpy(),
+                *(group[col].to_numpy(dtype=np.float64) for col in ('close', 'high', 'low')),
+            )
+            for ticker, group in prices.groupby('ticker', sort=True)
+        }
+    
+    def _compute_risk(self) -> pd.DataFrame:
+        """Worst day, average losing day and share of down days per ticker, in NumPy."""
+        rows = []
+        for ticker, prices in self._prices.items():
+            close = prices.close
+            ret = np.diff(close) / close[:-1]
+            # Like WHERE ret IS NOT NULL: returns touching a NULL close are left out
+            ret = ret[np.isfinite(ret)]
+            if ret.size == 0:
+                continue
+            losses = ret[ret < 0]
+            rows.append((
+                ticker,
+                round(ret.min() * 100, 2),
+                round(losses.mean() * 100, 2) if losses.size else np.nan,
+                round((ret < 0).mean() * 100, 1),
+            ))
+        return pd.DataFrame(rows, columns=['ticker', 'worst_day_pct', 'avg_loss_pct', 'down_days_pct'])
+    
+    def _compute_volatility(self) -> pd.DataFrame:
+        """Mean intraday range as a percentage of close per ticker, most volatile first, in NumPy."""
+        rows = []
+        for ticker, prices in self._prices.items():
+            day_range = (prices.high - prices.low) / prices.close * 100
+            # AVG skips NULLs: ranges touching a NULL price are left out
+            day_range = day_range[np.isfinite(day_range)]
+            rows.append((ticker, round(day_range.mean(), 2) if day_range.size else np.nan))
+        result = pd.DataFrame(rows, columns=['ticker', 'avg_volatility_pct'])
+        return result.sort_values('avg_volatility_pct', ascending=False, kind='stable').reset_index(drop=True)
+    
+    def _compute_ma(self, ticker: str) -> pd.DataFrame:
+        """7- and 30-day trailing means of one ticker's closes via the rolling kernel."""
+        prices = self._prices.get(ticker)
+        if prices is None:
+            return pd.DataFrame(columns=['date', 'close', 'ma_7', 'ma_30'])
+        return pd.DataFrame({
+            'date': prices.date,
+            'close': prices.close,
+            'ma_7': rolling_mean(prices.close, 7),
+            'ma_30': rolling_mean(prices.close, 30),
+        })
+    
+    def _compute_returns(self) -> pd.DataFrame:
+        """Daily returns per ticker via the rolling kernel, latest 30 rows first."""
+        frames = [
+            pd.DataFrame({
+                'ticker': ticker,
+                'date': prices.date,
+                'close': prices.close,
+                'return_pct': np.round(rolling_return(prices.close) * 100, 2),
+            })
+            for ticker, prices in self._prices.items()
+        ]
+        if not frames:
+            return pd.DataFrame(columns=['ticker', 'date', 'close', 'return_pct'])
+        result = pd.concat(frames, ignore_index=True)
+        result = result.sort_values('date', ascending=False, kind='stable').head(30)
+        return result.reset_index(drop=True)
+    
+    def _kernel_plan(self, question: str) -> Optional[Tuple[str, Callable[[], pd.DataFrame]]]:
+        """
+        For intents answered in-process instead of SQL, return a description of the
+        computation and a callable producing the result; None means run the SQL.
+        Expects the canonical question, the same string passed to SQL generation.
+        """
+        intent = _classify(question)
+        if intent == 'ma':
+            ticker = self._extract_ticker(question)
+            return (f"rolling_mean(close, 7) and rolling_mean(close, 30) over {ticker} closes",
+                    lambda: self._compute_ma(ticker))
+        if intent == 'ret':
+            return "rolling_return(close) per ticker, latest 30 rows", self._compute_returns
+        if intent == 'risk':
+            return ("np.diff(close) / close[:-1] per ticker: min, mean of losses, share of down days",
+                    self._compute_risk)
+        if intent == 'vol':
+            return "mean((high - low) / close) per ticker", self._compute_volatility
+        return None
     
     def ask(self, question: str, show_viz: bool = True) -> pd.DataFrame:
         """Main interface: Ask a natural language question, get results."""
+        self._report_charts()
         print(f"\n🗣️  QUESTION: {question}")
         print("-" * 70)
         
-        sql, explanation = self.generate_sql(question)
-        print(f"🤖 GENERATED SQL:\n{sql}")
+        # Canonicalize once so SQL generation and the kernel plan see the same question
+        canonical = _canonical(question)
+        sql, params, explanation = _gen(canonical)
+        plan = self._kernel_plan(canonical)
+        if plan is None:
+            computed = None
+            print(f"🤖 GENERATED SQL:\n{sql}")
+            if params:
+                print(f"🔗 Parameters: {params}")
+            cache_key = f"{self._schema_version}:{' '.join(sql.split())}:{params}"
+            compute = lambda: self.execute(sql, params)
+        else:
+            # Report what actually runs: these intents never touch the generated SQL
+            computed, compute = plan
+            sql, params = None, ()
+            print(f"⚙️  COMPUTED IN-PROCESS:\n{computed}")
+            cache_key = f"{self._schema_version}:{computed}"
         print(f"\n💡 Explanation: {explanation}")
         print("-" * 70)
         
-        result = self.execute(sql)
+        if cache_key not in self._result_cache:
+            self._result_cache[cache_key] = compute()
+        result = self._result_cache[cache_key].copy()
         print(f"📊 RESULTS ({len(result)} rows):")
         print(result.to_string(index=False))
         
         self.query_history.append({
             'question': question,
             'sql': sql,
+            'params': params,
+            'computed': computed,
             'rows': len(result)
         })
         
         if show_viz and len(result) > 0:
-            self.visualize(question, result)
+            if _headless():
+                self._viz_futures.append(self._viz_pool.submit(self.visualize, question, result.copy()))
+            else:
+                # GUI backends must draw on the main thread
+                self.visualize(question, result)
+                print("\n📈 Visualization saved to images/latest_viz.png")
         
         return result
     
+    def _axes(self) -> plt.Axes:
+        """Return the shared plot Axes, cleared, recreating the figure if it was closed."""
+        if self._fig is None or not plt.fignum_exists(self._fig.number):
+            self._fig, self._ax = plt.subplots(figsize=(12, 6), tight_layout=True)
+        else:
+            self._ax.cla()
+        return self._ax
+    
     def visualize(self, question: str, result: pd.DataFrame) -> None:
         """Auto-generate appropriate visualization based on query results."""
-        fig, ax = plt.subplots(figsize=(12, 6))
+        ax = self._axes()
         
         if 'date' in result.columns and len(result) > 5:
+            if not pd.api.types.is_datetime64_any_dtype(result['date']):
+                result['date'] = pd.to_datetime(result['date'], utc=True).dt.tz_localize(None)
             
-            result['date'] = pd.to_datetime(result['date'], utc=True).dt.tz_localize(None)
-              
             if 'ma_7' in result.columns:
-                ax.plot(result['date'], result['close'], label='Close', alpha=0.7, color='gray')
-                ax.plot(result['date'], result['ma_7'], label='7-day MA', linewidth=2)
-                ax.plot(result['date'], result['ma_30'], label='30-day MA', linewidth=2)
+                dates = result['date'].to_numpy()
+                ax.plot(dates, result['close'].to_numpy(), label='Close', alpha=0.7, color='gray')
+                ax.plot(dates, result['ma_7'].to_numpy(), label='7-day MA', linewidth=2)
+                ax.plot(dates, result['ma_30'].to_numpy(), label='30-day MA', linewidth=2)
                 ax.set_title('Moving Average Analysis', fontsize=14, fontweight='bold')
                 ax.legend()
             
             elif 'return_pct' in result.columns:
-                colors = ['green' if x > 0 else 'red' for x in result['return_pct']]
-                ax.bar(range(len(result)), result['return_pct'], color=colors, alpha=0.7)
+                ret = result['return_pct'].to_numpy(dtype=np.float64, na_value=np.nan)
+                colors = np.where(ret > 0, 'green', 'red')
+                ax.bar(range(len(result)), ret, color=colors, alpha=0.7)
                 ax.set_title('Daily Returns (%)', fontsize=14, fontweight='bold')
                 ax.axhline(y=0, color='black', linestyle='-', linewidth=0.5)
             
@@ -171,20 +402,21 @@ class NL2SQLDemo:
             ax.set_xlabel('Date')
             ax.set_ylabel('Price ($)')
             ax.grid(True, alpha=0.3)
-            plt.xticks(rotation=45)
+            ax.tick_params(axis='x', labelrotation=45)
         
         elif 'ticker' in result.columns and len(result) <= 5:
-            metrics = [c for c in result.columns if c != 'ticker']
+            metrics = list(result.select_dtypes('number').columns)
             if metrics:
-                result.plot(x='ticker', kind='bar', ax=ax)
+                result.plot(x='ticker', y=metrics, kind='bar', ax=ax)
                 ax.set_title('Stock Comparison', fontsize=14, fontweight='bold')
                 ax.legend()
                 ax.grid(True, alpha=0.3, axis='y')
         
-        plt.tight_layout()
-        plt.savefig('images/latest_viz.png', dpi=150, bbox_inches='tight')
-        plt.show()
-        print("\n📈 Visualization saved to images/latest_viz.png")
+        # Layout is handled by the figure's tight_layout engine; fast zlib level keeps the save cheap
+        self._fig.savefig('images/latest_viz.png', dpi=100,
+                          pil_kwargs={'compress_level': 1, 'optimize': False})
+        if not _headless():
+            plt.show()
 
 
 if __name__ == "__main__":
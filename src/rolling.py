@@ -0,0 +1,54 @@
+"""
+Rolling Kernels - Numba-compiled window aggregations over price arrays
+"""
+
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True)
+def _rolling_mean(a: np.ndarray, window: int) -> np.ndarray:
+    """
+    Trailing mean over the last `window` values, using a running sum (O(N)).
+    NaNs are skipped like SQL NULLs in AVG() OVER; a window with no values yields NaN.
+    """
+    out = np.empty_like(a)
+    total = 0.0
+    nobs = 0
+    for i in range(a.size):
+        value = a[i]
+        if not np.isnan(value):
+            total += value
+            nobs += 1
+        if i >= window:
+            dropped = a[i - window]
+            if not np.isnan(dropped):
+                total -= dropped
+                nobs -= 1
+        out[i] = total / nobs if nobs > 0 else np.nan
+    return out
+
+
+@njit(cache=True)
+def _rolling_return(a: np.ndarray) -> np.ndarray:
+    """Simple period-over-period return; the first element is NaN."""
+    out = np.empty_like(a)
+    if a.size > 0:
+        out[0] = np.nan
+    for i in range(1, a.size):
+        out[i] = (a[i] - a[i - 1]) / a[i - 1]
+    return out
+
+
+try:
+    # Precompiled by `python -m src._rolling_aot`; skips JIT compilation entirely
+    from .rolling_aot import rolling_mean_f64 as rolling_mean, rolling_return_f64 as rolling_return
+except ImportError:
+    rolling_mean, rolling_return = _rolling_mean, _rolling_return
+
+
+def warmup() -> None:
+    """Trigger JIT compilation so the first query doesn't pay for it (no-op cost when AOT-built)."""
+    sample = np.ones(2, dtype=np.float64)
+    rolling_mean(sample, 1)
+    rolling_return(sample)
@@ -0,0 +1,56 @@
+"""
+Loader tests: create_database must leave the file consistent whether the load succeeds or fails.
+"""
+
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data_loader import create_database
+
+
+def _prices_frame(periods=5):
+    dates = pd.date_range("2024-01-01", periods=periods, freq="B", tz="America/New_York")
+    close = np.linspace(100.0, 110.0, periods)
+    return pd.DataFrame({
+        "date": dates, "open": close, "high": close + 1, "low": close - 1,
+        "close": close, "volume": np.arange(1_000, 1_000 + periods), "ticker": "AAPL",
+    })
+
+
+def test_failed_load_rolls_back_and_releases_the_file(tmp_path):
+    db_path = str(tmp_path / "stock_database.db")
+    create_database(_prices_frame(), db_path)
+
+    # sqlite3 cannot bind a dict, so the bulk insert fails midway through the transaction
+    bad = _prices_frame(3).assign(ticker=[{"bad": 1}, "MSFT", "MSFT"])
+    with pytest.raises(sqlite3.ProgrammingError):
+        create_database(bad, db_path)
+
+    conn = sqlite3.connect(db_path, timeout=0)
+    try:
+        conn.execute("BEGIN IMMEDIATE")  # raises "database is locked" if the failed load held on
+        conn.execute("ROLLBACK")
+        assert conn.execute("SELECT COUNT(*) FROM stock_prices").fetchone()[0] == 5
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    finally:
+        conn.close()
+
+
+def test_missing_values_are_stored_as_null(tmp_path):
+    db_path = str(tmp_path / "stock_database.db")
+    frame = _prices_frame()
+    frame.loc[1, "open"] = np.nan
+    # Arrow-backed frames carry pd.NA, which sqlite3 cannot bind directly
+    frame = frame.convert_dtypes(dtype_backend="pyarrow")
+    frame.loc[2, "close"] = pd.NA
+    create_database(frame, db_path)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("SELECT open IS NULL, close IS NULL FROM stock_prices ORDER BY date").fetchall()
+    finally:
+        conn.close()
+    assert rows == [(0, 0), (1, 0), (0, 1), (0, 0), (0, 0)]
@@ -0,0 +1,111 @@
+"""
+Parity tests: the in-process metrics must match the SQL queries they replace.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data_loader import create_database
+from src.nl2sql import NL2SQLDemo
+
+
+# Reference queries: the window-function SQL the in-process metrics replace
+MA_SQL = """
+    SELECT date, close,
+        AVG(close) OVER (ORDER BY date ROWS 6 PRECEDING) as ma_7,
+        AVG(close) OVER (ORDER BY date ROWS 29 PRECEDING) as ma_30
+    FROM stock_prices
+    WHERE ticker = ?
+    ORDER BY date
+"""
+RETURNS_SQL = """
+    SELECT ticker, date, close,
+        ROUND((close - LAG(close) OVER w) / LAG(close) OVER w * 100, 2) as return_pct
+    FROM stock_prices
+    WINDOW w AS (PARTITION BY ticker ORDER BY date)
+    ORDER BY date DESC
+    LIMIT 30
+"""
+RISK_SQL = """
+    WITH daily_returns AS (
+        SELECT ticker, (close - LAG(close) OVER w) / LAG(close) OVER w as ret
+        FROM stock_prices
+        WINDOW w AS (PARTITION BY ticker ORDER BY date)
+    )
+    SELECT ticker,
+        ROUND(MIN(ret)*100, 2) as worst_day_pct,
+        ROUND(AVG(CASE WHEN ret<0 THEN ret END)*100, 2) as avg_loss_pct,
+        ROUND(COUNT(CASE WHEN ret<0 THEN 1 END)*100.0/COUNT(*), 1) as down_days_pct
+    FROM daily_returns
+    WHERE ret IS NOT NULL
+    GROUP BY ticker
+"""
+VOLATILITY_SQL = """
+    SELECT ticker, ROUND(AVG((high-low)/close*100), 2) as avg_volatility_pct
+    FROM stock_prices
+    GROUP BY ticker
+    ORDER BY avg_volatility_pct DESC
+"""
+
+
+def _build_demo(tmp_path_factory, with_nulls=False):
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2024-01-01", periods=60, freq="B", tz="America/New_York")
+    frames = []
+    for ticker in ("AAPL", "MSFT", "NVDA"):
+        close = 100 * np.cumprod(1 + rng.normal(0, 0.02, dates.size))
+        spread = rng.uniform(0.5, 3.0, dates.size)
+        frames.append(pd.DataFrame({
+            "date": dates, "open": close, "high": close + spread, "low": close - spread,
+            "close": close, "volume": rng.integers(1_000, 10_000, dates.size), "ticker": ticker,
+        }))
+    prices = pd.concat(frames, ignore_index=True)
+    if with_nulls:
+        # Databases written by to_sql can hold NULL prices; the SQL skips them
+        prices.loc[10, "close"] = np.nan
+        prices.loc[75, "high"] = np.nan
+    db_path = tmp_path_factory.mktemp("data") / "stock_database.db"
+    create_database(prices, str(db_path))
+    return NL2SQLDemo(str(db_path))
+
+
+@pytest.fixture(scope="module", params=[False, True], ids=["complete", "with_nulls"])
+def demo(request, tmp_path_factory):
+    demo = _build_demo(tmp_path_factory, with_nulls=request.param)
+    yield demo
+    demo.close()
+
+
+def _by_ticker(df):
+    return df.sort_values("ticker").reset_index(drop=True)
+
+
+def test_risk_matches_sql(demo):
+    expected = demo.execute(RISK_SQL)
+    pd.testing.assert_frame_equal(_by_ticker(demo._compute_risk()), _by_ticker(expected), check_dtype=False)
+
+
+def test_volatility_matches_sql(demo):
+    expected = demo.execute(VOLATILITY_SQL)
+    pd.testing.assert_frame_equal(_by_ticker(demo._compute_volatility()), _by_ticker(expected), check_dtype=False)
+
+
+def test_moving_average_matches_sql(demo):
+    pd.testing.assert_frame_equal(demo._compute_ma("MSFT"), demo.execute(MA_SQL, ("MSFT",)), check_dtype=False)
+
+
+def test_returns_match_sql(demo):
+    # Rows sharing a date may come back in any ticker order, so compare sorted
+    def ordered(df):
+        return df.sort_values(["date", "ticker"], ascending=[False, True]).reset_index(drop=True)
+    expected = demo.execute(RETURNS_SQL)
+    pd.testing.assert_frame_equal(ordered(demo._compute_returns()), ordered(expected), check_dtype=False)
+
+
+def test_ask_routes_uncanonical_question_to_kernel(demo):
+    # Extra whitespace must not split "moving average" into the plain average intent
+    result = demo.ask("Show me the moving  average for Apple", show_viz=False)
+    entry = demo.query_history[-1]
+    assert entry['sql'] is None and entry['computed'].endswith("over AAPL closes")
+    assert list(result.columns) == ['date', 'close', 'ma_7', 'ma_30']
@@ -0,0 +1,55 @@
+"""
+Parity tests: the rolling kernels must match the SQLite window functions they replace.
+"""
+
+import sqlite3
+
+import numpy as np
+
+from src.rolling import rolling_mean, rolling_return
+
+
+def _sql_window_mean(values, window):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (i INTEGER, v REAL)")
+    conn.executemany("INSERT INTO t VALUES (?, ?)",
+                     [(i, None if np.isnan(v) else float(v)) for i, v in enumerate(values)])
+    rows = conn.execute(
+        f"SELECT AVG(v) OVER (ORDER BY i ROWS {window - 1} PRECEDING) FROM t ORDER BY i"
+    ).fetchall()
+    conn.close()
+    return np.array([np.nan if r[0] is None else r[0] for r in rows])
+
+
+def _sql_lag_return(values):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (i INTEGER, v REAL)")
+    conn.executemany("INSERT INTO t VALUES (?, ?)", [(i, float(v)) for i, v in enumerate(values)])
+    rows = conn.execute(
+        "SELECT (v - LAG(v) OVER (ORDER BY i)) / LAG(v) OVER (ORDER BY i) FROM t ORDER BY i"
+    ).fetchall()
+    conn.close()
+    return np.array([np.nan if r[0] is None else r[0] for r in rows])
+
+
+def test_rolling_mean_matches_sql_window():
+    values = np.random.default_rng(0).uniform(50, 150, 200)
+    for window in (1, 7, 30):
+        np.testing.assert_allclose(rolling_mean(values, window), _sql_window_mean(values, window))
+
+
+def test_rolling_mean_skips_nan_like_sql_null():
+    values = np.array([1.0, np.nan, 3.0, 4.0, 5.0])
+    np.testing.assert_allclose(rolling_mean(values, 2), [1.0, 1.0, 3.0, 3.5, 4.5])
+    np.testing.assert_allclose(rolling_mean(values, 2), _sql_window_mean(values, 2))
+
+
+def test_rolling_mean_all_nan_window_is_nan():
+    values = np.array([np.nan, np.nan, 2.0])
+    np.testing.assert_allclose(rolling_mean(values, 2), _sql_window_mean(values, 2))
+    assert np.isnan(rolling_mean(values, 2)[:2]).all()
+
+
+def test_rolling_return_matches_sql_lag():
+    values = np.random.default_rng(1).uniform(50, 150, 200)
+    np.testing.assert_allclose(rolling_return(values), _sql_lag_return(values))
@@ -0,0 +1,19 @@
+"""
+Routing tests: intent and ticker resolution keep the original substring-ladder priority.
+"""
+
+from src.nl2sql import _classify, _extract_ticker
+
+
+def test_classify_uses_ladder_priority():
+    assert _classify("average return") == 'ret'
+    assert _classify("show me the 7-day moving averages") == 'ma'
+    assert _classify("risk and volatility") == 'risk'
+    assert _classify("hello") is None
+
+
+def test_extract_ticker_uses_ladder_priority():
+    assert _extract_ticker("compare microsoft and apple moving average") == 'AAPL'
+    assert _extract_ticker("nvda vs msft") == 'MSFT'
+    assert _extract_ticker("nvidia") == 'NVDA'
+    assert _extract_ticker("no ticker here") == 'AAPL'